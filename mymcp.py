@@ -4,16 +4,25 @@ FastMCP myMcp Server
 
 from fastmcp import FastMCP, Context
 import httpx
+import orjson
 import pandas as pd
+from openpyxl import Workbook, load_workbook
 import os
 from dotenv import load_dotenv
 import asyncio 
+import functools
+import io
 import random # Added for random choice
 
 import googleapiclient.discovery
 import googleapiclient.errors
+from googleapiclient.http import build_http
 import re
-from datetime import timedelta
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, closing
 
 
 load_dotenv() # .env 파일에서 환경 변수 로드
@@ -36,11 +45,10 @@ if not YOUTUBE_API_KEY:
 if not NOTION_TOKEN or not DATABASE_ID or not NOTION_VERSION:
     raise ValueError("오류: .env 파일에서 Notion 관련 환경 변수를 찾을 수 없습니다. (.env 파일 생성 및 내용 확인 필요)")
 
-# 허용된 상태 값 리스트
-ALLOWED_STATUS_VALUES = ["NY", "NG", "BK", "QA", "OK", "진행중"]
-
-# Create server
-mcp = FastMCP("myMCP Server")
+# 허용된 상태 값 (체크는 frozenset으로, 오류 메시지용 문자열은 미리 만들어 둠)
+_STATUS_CHOICES = ("NY", "NG", "BK", "QA", "OK", "진행중")
+ALLOWED_STATUS_VALUES = frozenset(_STATUS_CHOICES)
+ALLOWED_STATUS_STR = ", ".join(_STATUS_CHOICES)
 
 headers = {
     "Authorization": f"Bearer {NOTION_TOKEN}",
@@ -48,62 +56,160 @@ headers = {
     "Content-Type": "application/json"
 }
 
+# 노션 API용 공용 클라이언트 (툴 호출마다 TCP/TLS 핸드셰이크를 반복하지 않도록 재사용)
+_notion_client: httpx.AsyncClient | None = None
+
+def _get_notion_client() -> httpx.AsyncClient:
+    """공용 클라이언트를 반환. 처음 쓸 때 만들고, lifespan 종료로 닫혔으면 다시 만든다."""
+    global _notion_client
+    # 생성까지 await가 없어서 이벤트 루프 안에서는 두 번 만들어질 일이 없으므로 Lock은 불필요
+    if _notion_client is None or _notion_client.is_closed:
+        _notion_client = httpx.AsyncClient(
+            base_url="https://api.notion.com/v1",
+            headers=headers,
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            timeout=httpx.Timeout(10.0, connect=5.0),
+        )
+    return _notion_client
+
+
+# lifespan은 SSE 연결마다 들어오므로, 열려 있는 세션 수를 세서 마지막 세션이 끝날 때만 클라이언트를 닫는다
+# (다른 세션에서 진행 중인 노션 요청이 끊기지 않도록)
+_active_sessions = 0
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """마지막 세션(또는 서버)이 종료될 때 공용 HTTP 클라이언트를 닫는다."""
+    global _active_sessions
+    _active_sessions += 1
+    try:
+        yield
+    finally:
+        _active_sessions -= 1
+        if _active_sessions == 0 and _notion_client is not None:
+            await _notion_client.aclose()
+
+
+# Create server
+mcp = FastMCP("myMCP Server", lifespan=lifespan)
+
+NOTION_PAGE_SIZE = 100 # 노션 쿼리 1회당 최대 건수
+NOTION_RETRY_STATUS = frozenset({429, 502, 503, 504}) # 조회 요청에서 재시도할 응답 코드 (rate limit, 일시적인 서버 오류)
+# 페이지 생성은 멱등이 아니라서 502/504는 이미 생성된 뒤에 올 수도 있음 → 처리되지 않은 게 확실한 429만 재시도 (중복 생성 방지)
+NOTION_CREATE_RETRY_STATUS = frozenset({429})
+NOTION_MAX_ATTEMPTS = 5
+
+async def _notion_post(path: str, retry_status: frozenset[int], **kwargs) -> httpx.Response:
+    """
+    공용 클라이언트로 노션에 POST.
+    응답 코드가 retry_status에 있으면 지수 백오프(+지터)로 재시도하고, Retry-After 헤더가 있으면 그 값을 따른다.
+    """
+    for attempt in range(1, NOTION_MAX_ATTEMPTS + 1):
+        response = await _get_notion_client().post(path, **kwargs)
+        if response.status_code not in retry_status or attempt == NOTION_MAX_ATTEMPTS:
+            return response
+
+        try:
+            delay = float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            delay = min(2 ** (attempt - 1), 8) + random.random() * 0.3
+        await asyncio.sleep(delay)
+
+# 노션 DB 속성 이름
+_TITLE, _TEXT, _DATE, _STATUS, _ASSIGNEE = "제목", "텍스트", "날짜", "상태", "담당자"
+_EMPTY: dict = {}
+
+async def _query_notion_database(filter_: dict | None = None) -> list[dict]:
+    """
+    next_cursor를 따라가며 데이터베이스의 모든 페이지를 가져온다. (한 번에 최대 100건만 오므로)
+    filter_를 주면 노션 쪽에서 걸러진 결과만 받음.
+    """
+    results = []
+    base_body = {"page_size": NOTION_PAGE_SIZE} if filter_ is None else {"page_size": NOTION_PAGE_SIZE, "filter": filter_}
+    body = base_body
+    while True:
+        response = await _notion_post(f"/databases/{DATABASE_ID}/query", NOTION_RETRY_STATUS, json=body)
+        response.raise_for_status()
+
+        data = orjson.loads(response.content) # 페이지가 많으면 JSON 파싱 비용이 커서 orjson 사용
+        results.extend(data.get("results", []))
+        if not data.get("has_more") or not data.get("next_cursor"):
+            return results
+        body = {**base_body, "start_cursor": data["next_cursor"]}
+
+# read_notion_database 결과 캐시. 짧은 시간 안에 반복 조회하면 네트워크 요청 없이 돌려줌 (쓰기 성공 시 비움)
+NOTION_READ_CACHE_TTL = float(os.getenv("NOTION_READ_CACHE_TTL", "30")) # 초
+_notion_read_cache: dict[tuple[str, str | None], tuple[float, str]] = {} # {(데이터베이스 ID, 상태 필터): (저장 시각, 출력 문자열)}
+
+def _format_row(page: dict) -> str:
+    """노션 페이지 하나를 '[날짜] 제목 - 텍스트(상태, 담당자)' 한 줄로 변환"""
+    props = page.get("properties", _EMPTY)
+
+    # 값 추출
+    title = t[0]["text"]["content"] if (t := props.get(_TITLE, _EMPTY).get("title")) else "제목 없음"
+    text = t[0]["text"]["content"] if (t := props.get(_TEXT, _EMPTY).get("rich_text")) else "-"
+    date = (props.get(_DATE, _EMPTY).get("date") or _EMPTY).get("start") or "-"
+    status = (props.get(_STATUS, _EMPTY).get("status") or _EMPTY).get("name") or "-" # Status 타입
+
+    # '담당자'는 사람(people) 속성이 우선, 없으면 텍스트 속성
+    assignee_prop = props.get(_ASSIGNEE, _EMPTY)
+    if people := assignee_prop.get("people"):
+        assignee = ", ".join([person.get("name", "이름없음") for person in people if person])
+    elif rich_text := assignee_prop.get("rich_text"):
+        assignee = rich_text[0]["text"]["content"]
+    else:
+        assignee = "-"
+
+    return f"[{date}] {title} - {text}(상태: {status}, 담당자: {assignee})"
+
 @mcp.tool()
-async def read_notion_database() -> str:
-    """노션 데이터베이스 내용을 비동기로 가져오는 MCP 툴 (상태, 담당자 포함)"""
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    async with httpx.AsyncClient() as client:
+async def read_notion_database(status: str | None = None) -> str:
+    """
+    노션 데이터베이스 내용을 비동기로 가져오는 MCP 툴 (상태, 담당자 포함)
+    상태가 지정되면 해당 상태의 항목만 노션에서 걸러서 가져옴.
+    """
+    if status is not None and status not in ALLOWED_STATUS_VALUES:
+        return f"❌ 읽기 실패! '상태' 값은 {ALLOWED_STATUS_STR} 중 하나여야 합니다. 입력값: {status}"
+
+    cache_key = (DATABASE_ID, status)
+    cached = _notion_read_cache.get(cache_key)
+    if cached and time.monotonic() - cached[0] < NOTION_READ_CACHE_TTL:
+        return cached[1]
+
+    try:
+        # 필터는 노션 쪽에서 처리 (필요 없는 페이지는 전송/파싱하지 않음)
+        filter_ = {"property": _STATUS, "status": {"equals": status}} if status is not None else None
+        results = await _query_notion_database(filter_)
+        output = "\n".join([_format_row(page) for page in results]) if results else "데이터베이스가 비어 있습니다."
+        _notion_read_cache[cache_key] = (time.monotonic(), output)
+        return output
+
+    except httpx.HTTPStatusError as e:
+        error_details = e.response.text
         try:
-            response = await client.post(url, headers=headers)
-            response.raise_for_status()
-
-            results = response.json().get("results", [])
-            output_lines = []
-            for page in results:
-                props = page.get("properties", {})
-
-                # 값 추출
-                title_prop = props.get("제목", {}).get("title", []) 
-                title = title_prop[0]["text"]["content"] if title_prop else "제목 없음"
-
-                text_prop = props.get("텍스트", {}).get("rich_text", [])
-                text = text_prop[0]["text"]["content"] if text_prop else "-"
-
-                date_prop = props.get("날짜", {}).get("date")
-                date = date_prop["start"] if date_prop and date_prop.get("start") else "-"
-
-                # '상태' 속성 읽기 (Status 타입)
-                status_prop = props.get("상태", {}).get("status") # 'status' 키 사용
-                status = status_prop["name"] if status_prop and status_prop.get("name") else "-"
-
-                # '담당자' 속성 읽기 
-                assignee_prop = props.get("담당자", {}).get("people", [])
-                if assignee_prop:
-                    assignee = ", ".join([person.get("name", "이름없음") for person in assignee_prop if person])
-                else:
-                    assignee_prop = props.get("담당자", {}).get("rich_text", [])
-                    if assignee_prop:
-                         assignee = assignee_prop[0]["text"]["content"] if assignee_prop else "-"
-                    else:
-                        assignee = "-" 
-
-                # 출력 문자열
-                output_lines.append(f"[{date}] {title} - {text}(상태: {status}, 담당자: {assignee})")
-
-            return "\\n".join(output_lines) if output_lines else "데이터베이스가 비어 있습니다."
-
-        except httpx.HTTPStatusError as e:
-            error_details = e.response.text
-            try:
-                notion_error = e.response.json()
-                error_details = notion_error.get("message", error_details)
-            except Exception:
-                pass
-            return f"❌ 읽기 실패! 상태 코드 {e.response.status_code}. 이유: {error_details}"
-        except httpx.RequestError as e:
-            return f"❌ 읽기 실패! 네트워크 오류: {e}"
-        except Exception as e:
-            return f"❌ read_notion_database 오류: {e}"
+            notion_error = e.response.json()
+            error_details = notion_error.get("message", error_details)
+        except Exception:
+            pass
+        return f"❌ 읽기 실패! 상태 코드 {e.response.status_code}. 이유: {error_details}"
+    except httpx.RequestError as e:
+        return f"❌ 읽기 실패! 네트워크 오류: {e}"
+    except Exception as e:
+        return f"❌ read_notion_database 오류: {e}"
+
+def _build_page_properties(title: str, text: str, date: str, status: str, assignee: str | None) -> dict:
+    """새 페이지의 properties 본문 생성 (담당자는 있을 때만 추가)"""
+    properties = {
+        _TITLE: {"title": [{"text": {"content": title}}]},
+        _TEXT: {"rich_text": [{"text": {"content": text}}]},
+        _DATE: {"date": {"start": date}},
+        _STATUS: {"status": {"name": status}},
+    }
+    if assignee is not None:
+        # 담당자 속성은 노션에서 가져와야하는데 없으니까 일단 텍스트
+        properties[_ASSIGNEE] = {"rich_text": [{"text": {"content": assignee}}]}
+    return properties
 
 @mcp.tool()
 async def add_notion_page(
@@ -118,56 +224,225 @@ async def add_notion_page(
     상태가 지정되지 않으면 'NY'를 사용.
     담당자가 지정되면 해당 값으로 설정하고, 지정되지 않으면 설정하지 않음.
     """
-    url = "https://api.notion.com/v1/pages"
-
     # 상태 값 처리: 없으면 'NY' 사용, 있으면 체크
     final_state = status if status is not None else "NY"
 
     if final_state not in ALLOWED_STATUS_VALUES:
-        return f"❌ 추가 실패! '상태' 값은 {', '.join(ALLOWED_STATUS_VALUES)} 중 하나여야 합니다. 입력값: {final_state}"
-
-    properties_payload = {
-        "제목": {"title": [{"text": {"content": title}}]},
-        "텍스트": {"rich_text": [{"text": {"content": text}}]},
-        "날짜": {"date": {"start": date}},
-        "상태": {"status": {"name": final_state}},
-    }
-
-    # 담당자 값이 있음녀 추가
-    if assignee is not None:
-        # 담당자 속성은 노션에서 가져와야하는데 없으니까 일단 텍스트
-        properties_payload["담당자"] = {"rich_text": [{"text": {"content": assignee}}]}
+        return f"❌ 추가 실패! '상태' 값은 {ALLOWED_STATUS_STR} 중 하나여야 합니다. 입력값: {final_state}"
 
+    properties_payload = _build_page_properties(title, text, date, final_state, assignee)
     data = {
         "parent": { "database_id": DATABASE_ID },
         "properties": properties_payload
     }
 
-    async with httpx.AsyncClient() as client:
+    try:
+        # orjson으로 직렬화해서 바이트로 바로 전송 (Content-Type은 공용 헤더에 있음)
+        response = await _notion_post("/pages", NOTION_CREATE_RETRY_STATUS, content=orjson.dumps(data))
+        response.raise_for_status()
+        _notion_read_cache.clear() # 새 페이지가 바로 보이도록 읽기 캐시 비움
+
+        # 성공 메시지 업데이트 (담당자 설정 여부 표시)
+        assignee = f"담당자: {assignee}" if assignee is not None else "담당자 미지정"
+        return f"✅ 등록 성공! (상태: {final_state}, {assignee})"
+
+    except httpx.HTTPStatusError as e:
+        error_details = e.response.text
         try:
-            response = await client.post(url, headers=headers, json=data)
-            response.raise_for_status()
-
-            # 성공 메시지 업데이트 (담당자 설정 여부 표시)
-            assignee = f"담당자: {assignee}" if assignee is not None else "담당자 미지정"
-            return f"✅ 등록 성공! (상태: {final_state}, {assignee})"
-
-        except httpx.HTTPStatusError as e:
-            error_details = e.response.text
-            try:
-                notion_error = e.response.json()
-                error_details = notion_error.get("message", error_details)
-            except Exception:
-                pass
-            return (f"❌ 추가 실패! 상태 코드 {e.response.status_code}. 이유: {error_details}\\n"
-                    f"전송된 데이터: {properties_payload}")
-        except httpx.RequestError as e:
-            return f"❌ 추가 실패! 네트워크 오류: {e}"
-        except Exception as e:
-            return f"❌ 추가 실패! 예상치 못한 오류: {e}"
+            notion_error = e.response.json()
+            error_details = notion_error.get("message", error_details)
+        except Exception:
+            pass
+        return (f"❌ 추가 실패! 상태 코드 {e.response.status_code}. 이유: {error_details}\n"
+                f"전송된 데이터: {properties_payload}")
+    except httpx.RequestError as e:
+        return f"❌ 추가 실패! 네트워크 오류: {e}"
+    except Exception as e:
+        return f"❌ 추가 실패! 예상치 못한 오류: {e}"
+
+NOTION_WRITE_CONCURRENCY = 5 # 일괄 추가 시 동시에 보내는 요청 수
+
+async def _create_notion_page(sem: asyncio.Semaphore, data: dict) -> None:
+    """페이지 하나를 생성 (실패 시 예외 발생)"""
+    async with sem:
+        response = await _notion_post("/pages", NOTION_CREATE_RETRY_STATUS, content=orjson.dumps(data))
+    response.raise_for_status()
+
+def _describe_notion_error(e: BaseException) -> str:
+    """노션 요청 예외를 사용자용 메시지로 변환"""
+    if isinstance(e, httpx.HTTPStatusError):
+        error_details = e.response.text
+        try:
+            error_details = e.response.json().get("message", error_details)
+        except Exception:
+            pass
+        return f"상태 코드 {e.response.status_code}. 이유: {error_details}"
+    if isinstance(e, httpx.RequestError):
+        return f"네트워크 오류: {e}"
+    return f"예상치 못한 오류: {e}"
+
+@mcp.tool()
+async def add_notion_pages(items: list[dict]) -> str:
+    """
+    노션에 여러 할 일을 한 번에 추가하는 MCP 툴.
+    요청은 최대 NOTION_WRITE_CONCURRENCY개씩 동시에 보냄.
+
+    Args:
+        items (list[dict]): 추가할 할 일 목록.
+            각 항목은 'title', 'text', 'date' 키가 필요하고, 'status'(기본 'NY')와 'assignee'는 선택.
+
+    Returns:
+        str: 전체 결과 요약과 실패한 항목별 사유.
+    """
+    failures = {} # {항목 번호: 실패 메시지}
+    labels = []
+    payloads = []
+    for i, item in enumerate(items, start=1):
+        label = f"{i}번({item.get('title', '제목 없음')})"
+        missing = [key for key in ("title", "text", "date") if key not in item]
+        if missing:
+            failures[i] = f"❌ {label}: 필수 키 누락 {missing}"
+            continue
+
+        status = item.get("status")
+        final_state = status if status is not None else "NY"
+        if final_state not in ALLOWED_STATUS_VALUES:
+            failures[i] = f"❌ {label}: '상태' 값은 {ALLOWED_STATUS_STR} 중 하나여야 합니다. 입력값: {final_state}"
+            continue
+
+        labels.append((i, label))
+        payloads.append({
+            "parent": { "database_id": DATABASE_ID },
+            "properties": _build_page_properties(item["title"], item["text"], item["date"], final_state, item.get("assignee")),
+        })
+
+    sem = asyncio.Semaphore(NOTION_WRITE_CONCURRENCY)
+    results = await asyncio.gather(*[_create_notion_page(sem, data) for data in payloads], return_exceptions=True)
+    for (i, label), result in zip(labels, results):
+        if isinstance(result, BaseException):
+            failures[i] = f"❌ {label}: {_describe_notion_error(result)}"
+    if not all(isinstance(result, BaseException) for result in results):
+        _notion_read_cache.clear() # 하나라도 추가됐으면 읽기 캐시 비움
+
+    summary = f"✅ 총 {len(items)}건 중 {len(items) - len(failures)}건 등록 성공"
+    return "\n".join([summary, *(failures[i] for i in sorted(failures))]) if failures else summary
+
+# --- 엑셀 관련 ---
+
+# 읽기는 Rust 기반 calamine 엔진을 우선 사용 (없으면 openpyxl로 대체), 쓰기는 openpyxl
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_READ_ENGINE = "calamine"
+except ImportError:
+    EXCEL_READ_ENGINE = "openpyxl"
+
+# pyarrow가 있으면 문자열 컬럼을 Arrow 기반으로 읽음 (셀마다 파이썬 str 객체를 만들지 않고, .str 연산도 Arrow 커널로 처리)
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+# 이보다 큰 파일은 캐시하지 않음 (원본 바이트 + ExcelFile + DataFrame을 프로세스가 계속 들고 있게 되므로) (bytes)
+# find_ng_items_without_bug_id는 이보다 큰 파일을 DataFrame 대신 행 단위로 훑음
+LARGE_XLSX_THRESHOLD = 20 * 1024 * 1024
+
+# 하나의 ExcelFile을 여러 스레드에서 동시에 parse 하면 안전하지 않으므로 parse는 하나씩
+_excel_parse_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=4)
+def _open_excel(path: str, mtime_ns: int, size: int) -> pd.ExcelFile:
+    """
+    xlsx 파일을 열어 ExcelFile로 캐시 (zip 목록, shared strings 파싱은 파일당 한 번).
+    파일 핸들을 잡고 있으면 Windows에서 저장이 막히므로 내용을 메모리로 읽어서 연다.
+    """
+    with open(path, "rb") as f:
+        return pd.ExcelFile(io.BytesIO(f.read()), engine=EXCEL_READ_ENGINE)
+
+def _parse_options(sheet_name: str | None, columns, dtype) -> dict:
+    """ExcelFile.parse / pd.read_excel에 넘길 공통 옵션"""
+    return dict(
+        # sheet_name=None 이면 pandas는 모든 시트를 dict로 돌려주므로 첫 번째 시트(0)로 바꿔서 읽음
+        sheet_name=0 if sheet_name is None else sheet_name,
+        # 없는 컬럼이 섞여 있어도 예외가 나지 않도록 callable로 전달 (컬럼 존재 확인은 호출하는 쪽에서)
+        usecols=(lambda col: col in columns) if columns else None,
+        dtype=dtype,
+    )
+
+@functools.lru_cache(maxsize=8)
+def _load_xlsx(
+    path: str,
+    mtime_ns: int,
+    size: int,
+    sheet_name: str | None = None,
+    columns: tuple[str, ...] | None = None,
+    dtype: tuple[tuple[str, str], ...] | None = None,
+) -> pd.DataFrame:
+    """엑셀 파싱 결과를 (경로, 수정시각, 크기, 읽기 옵션) 기준으로 캐시. 파일이 바뀌면 키가 달라지므로 다시 읽는다."""
+    xl = _open_excel(path, mtime_ns, size)
+    with _excel_parse_lock:
+        return xl.parse(**_parse_options(sheet_name, columns, dict(dtype) if dtype else None))
+
+def _read_excel(
+    xlsx_path: str,
+    sheet_name: str | None = None,
+    columns: list[str] | None = None,
+    dtype: dict[str, str] | None = None,
+) -> pd.DataFrame:
+    """
+    캐시를 거쳐 엑셀 시트를 읽는다. columns를 주면 해당 컬럼만 파싱한다.
+    LARGE_XLSX_THRESHOLD보다 큰 파일은 캐시하지 않고 매번 읽는다.
+    반환된 DataFrame은 캐시와 공유되므로 직접 수정하지 말 것.
+    """
+    path = os.path.abspath(xlsx_path)
+    st = os.stat(path)
+    if st.st_size > LARGE_XLSX_THRESHOLD:
+        return pd.read_excel(path, engine=EXCEL_READ_ENGINE, **_parse_options(sheet_name, columns, dtype))
+    return _load_xlsx(
+        path, st.st_mtime_ns, st.st_size, sheet_name,
+        tuple(columns) if columns else None,
+        tuple(sorted(dtype.items())) if dtype else None,
+    )
+
+def _invalidate_xlsx_cache() -> None:
+    """엑셀 파일을 직접 수정한 뒤 호출해서 캐시를 비운다."""
+    _load_xlsx.cache_clear()
+    _open_excel.cache_clear()
+
+# find_ng_items_without_bug_id에서 읽는 컬럼과 타입
+NG_ITEM_DTYPES = {"시험항목ID": STRING_DTYPE, "시험결과": "category", "내부버그DB": STRING_DTYPE}
+
+def _scan_ng_items(xlsx_path: str, sheet_name: str | None = None) -> list[str]:
+    """
+    openpyxl read-only 모드로 한 행씩 읽으면서 find_ng_items_without_bug_id와 같은 조건의 시험항목ID를 모은다.
+    시트 전체를 메모리에 올리지 않으므로 메모리 사용량이 파일 크기와 무관.
+    """
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0] if sheet_name is None else wb[sheet_name]
+        rows = ws.iter_rows(values_only=True)
+        header = {name: i for i, name in enumerate(next(rows, ())) if name is not None}
+
+        # 필수 컬럼 확인
+        for col in NG_ITEM_DTYPES:
+            if col not in header:
+                return [f"❌ '{col}' 컬럼이 존재하지 않습니다. 확인해주세요."]
+        i_id, i_result, i_bug = (header[col] for col in ("시험항목ID", "시험결과", "내부버그DB"))
+        width = max(i_id, i_result, i_bug) + 1
+
+        ng_ids = []
+        for row in rows:
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            bug_id = row[i_bug]
+            if row[i_result] == "NG" and row[i_id] is not None and (bug_id is None or str(bug_id).strip() == ""):
+                ng_ids.append(str(row[i_id]))
+        return ng_ids
+    finally:
+        wb.close()
 
 @mcp.tool()
-def find_ng_items_without_bug_id(xlsx_path: str, sheet_name: str = None) -> list[str]:
+async def find_ng_items_without_bug_id(xlsx_path: str, sheet_name: str = None) -> list[str]:
     """
     xlsx 파일에서 '시험결과'가 'NG'이고 '내부버그DB'가 비어있는 항목의 '시험항목ID'를 리스트로 반환합니다.
     즉 JIRA에 등록이 안 된 항목들을 알려줍니다.
@@ -182,26 +457,87 @@ def find_ng_items_without_bug_id(xlsx_path: str, sheet_name: str = None) -> list
 
 
     try:
-        df = pd.read_excel(xlsx_path, sheet_name=sheet_name)
+        # 아주 큰 파일은 DataFrame을 만들지 않고 행 단위로 훑음
+        if os.path.getsize(xlsx_path) > LARGE_XLSX_THRESHOLD:
+            return await asyncio.to_thread(_scan_ng_items, xlsx_path, sheet_name)
+
+        # 필요한 3개 컬럼만 읽음. '시험결과'는 값 종류가 적어서 category로 읽으면 비교가 가벼워짐
+        # 파싱은 블로킹 작업이라 이벤트 루프를 막지 않도록 스레드에서 실행
+        df = await asyncio.to_thread(_read_excel, xlsx_path, sheet_name, columns=list(NG_ITEM_DTYPES), dtype=NG_ITEM_DTYPES)
 
         # 필수 컬럼 확인
-        required_columns = ["시험항목ID", "시험결과", "내부버그DB"]
-        for col in required_columns:
+        for col in NG_ITEM_DTYPES:
             if col not in df.columns:
                 return [f"❌ '{col}' 컬럼이 존재하지 않습니다. 확인해주세요."]
 
-        # 필터링
-        filtered = df[
-            (df["시험결과"] == "NG") &
-            (df["내부버그DB"].isnull() | (df["내부버그DB"].astype(str).str.strip() == ""))
-        ]
+        # 필터링: '시험결과'가 NG 이고 '내부버그DB'가 비어있음(NaN 또는 공백뿐)
+        # 문자열 처리(strip)는 비용이 크므로 NG 행에 대해서만 수행 (NG_ITEM_DTYPES로 이미 문자열 타입이라 astype 불필요)
+        is_ng = (df["시험결과"] == "NG").to_numpy(dtype=bool)
+        no_bug_id = (df["내부버그DB"][is_ng].fillna("").str.strip() == "").to_numpy(dtype=bool)
 
-        return filtered["시험항목ID"].dropna().astype(str).tolist()
+        return df["시험항목ID"][is_ng][no_bug_id].dropna().tolist()
 
     except Exception as e:
         return [f"❌ 오류 발생: {e}"]
 
 
+LLM_CONCURRENCY = 5 # 동시에 보내는 LLM 요청 수
+DEFAULT_BUG_TITLE = "임의작성" # LLM 제목 생성 실패 시 기본값
+BUG_TITLE_CACHE_SIZE = 256
+
+# 버그 리포트에 쓰는 엑셀 컬럼 (이 컬럼만 읽음). 리포트 필드는 이 순서대로 튜플로 꺼내 씀
+BUG_REPORT_FIELDS = ["확인내용", "시험순서", "기대결과", "비고", "어플리케이션 버전", "이용단말"]
+BUG_REPORT_COLUMNS = ["시험항목ID", *BUG_REPORT_FIELDS]
+
+# 버그 리포트 초안 양식 (항목마다 format으로 채움)
+BUG_REPORT_TEMPLATE = '''
+                 **타이틀: {title}**
+
+                 **확인내용**
+                 {check_content}
+
+                 **재현 절차**
+                {test_procedure}
+
+                 **기대 결과**
+                {expected_result}
+
+                 **비고**
+                {notes}
+
+                ・시험 ID : {item_id}
+                ・어플리케이션 버전 : {app_version}
+                ・이용단말 : {device}
+                ---'''
+
+# (기대결과, 비고) → LLM이 생성한 제목. 오래 안 쓴 것부터 버림 (LRU)
+_bug_title_cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+
+def _get_cached_bug_title(key: tuple[str, str]) -> str | None:
+    title = _bug_title_cache.get(key)
+    if title is not None:
+        _bug_title_cache.move_to_end(key)
+    return title
+
+def _cache_bug_title(key: tuple[str, str], title: str) -> None:
+    _bug_title_cache[key] = title
+    _bug_title_cache.move_to_end(key)
+    if len(_bug_title_cache) > BUG_TITLE_CACHE_SIZE:
+        _bug_title_cache.popitem(last=False)
+
+async def _generate_bug_title(ctx: Context, sem: asyncio.Semaphore, expected_result, actual_result_notes) -> str:
+    """'기대결과'와 '비고'를 바탕으로 LLM에게 버그 리포트 제목을 요청"""
+    prompt = f'''다음 정보를 바탕으로 버그 리포트의 제목을 "기대 결과는 A 였으나 시험 결과는 B였음" 형식으로 간결하게 작성해 주세요:
+
+                기대 결과: {expected_result}
+                실제 결과 또는 비고: {actual_result_notes}
+
+                제목:'''
+    async with sem:
+        title_response = await ctx.sample(prompt, max_tokens=100) # max_tokens는 적절히 조절
+    return title_response.text.strip() if title_response.text else DEFAULT_BUG_TITLE
+
+
 @mcp.tool()
 async def generate_bug_reports_from_ids(xlsx_path: str, item_ids: list[str], ctx: Context) -> str:
     """
@@ -218,62 +554,65 @@ async def generate_bug_reports_from_ids(xlsx_path: str, item_ids: list[str], ctx
 
     try:
         # ctx의 메소드들이 대부분 비동기라 비동기로 하는게 나음
-        df = await asyncio.to_thread(pd.read_excel, xlsx_path)
-        report_list = []
+        df = await asyncio.to_thread(_read_excel, xlsx_path, columns=BUG_REPORT_COLUMNS)
+        reports = {} # {시험항목ID: 리포트 문자열}
         llm_failures = 0 # LLM 호출 실패 횟수
 
-        for item_id in item_ids:
-            row = df[df["시험항목ID"] == item_id]
-            if row.empty:
-                report_list.append(f"⚠️ {item_id} → 데이터 없음\\\\n")
-                continue
-
-            row_data = row.iloc[0]
-
-            expected_result = row_data.get('기대결과', 'N/A') # .get()으로 키 존재 확인
-            actual_result_notes = row_data.get('비고', 'N/A') # .get()으로 키 존재 확인
-
-            generated_title = f"임의작성" # 기본값 설정
-
-            try:
-                # LLM에게 타이틀 생성 요청
-                prompt = f'''다음 정보를 바탕으로 버그 리포트의 제목을 "기대 결과는 A 였으나 시험 결과는 B였음" 형식으로 간결하게 작성해 주세요:
+        # 같은 ID가 여러 번 들어와도 조회/리포트 작성은 한 번만 (순서는 유지)
+        unique_ids = list(dict.fromkeys(item_ids))
+
+        # ID마다 전체 컬럼을 훑지 않도록 시험항목ID로 인덱싱해서 한 번에 조회 (중복 ID는 첫 행 사용)
+        indexed = df[~df["시험항목ID"].duplicated()].set_index("시험항목ID")
+        found = indexed.index.get_indexer(unique_ids) != -1
+        # 행마다 Series.get을 부르지 않도록 BUG_REPORT_FIELDS 순서의 튜플로 꺼냄 (엑셀에 없는 컬럼은 'N/A')
+        rows = indexed.reindex(index=unique_ids, columns=BUG_REPORT_FIELDS, fill_value='N/A')
+        entries = [
+            (item_id, values if is_found else None)
+            for item_id, values, is_found in zip(unique_ids, rows.itertuples(index=False, name=None), found)
+        ]
 
-                기대 결과: {expected_result}
-                실제 결과 또는 비고: {actual_result_notes}
+        # 프롬프트는 (기대결과, 비고)로만 정해지므로 같은 조합은 LLM을 한 번만 호출하고, 이전 호출에서 만든 제목은 캐시에서 재사용
+        entry_keys = [
+            (str(values[2]), str(values[3])) if values is not None else None # (기대결과, 비고)
+            for _, values in entries
+        ]
+        titles = {key: title for key in dict.fromkeys(entry_keys) if key and (title := _get_cached_bug_title(key))}
+        pending = [key for key in dict.fromkeys(entry_keys) if key and key not in titles]
+
+        # 남은 조합은 서로 독립적이라 한꺼번에 요청 (동시 요청 수는 세마포어로 제한)
+        sem = asyncio.Semaphore(LLM_CONCURRENCY)
+        results = await asyncio.gather(*[_generate_bug_title(ctx, sem, *key) for key in pending], return_exceptions=True)
+        for key, result in zip(pending, results):
+            titles[key] = result
+            if not isinstance(result, BaseException) and result != DEFAULT_BUG_TITLE:
+                _cache_bug_title(key, result)
+
+        for (item_id, values), key in zip(entries, entry_keys):
+            if values is None:
+                reports[item_id] = f"⚠️ {item_id} → 데이터 없음\n"
+                continue
 
-                제목:'''
-                title_response = await ctx.sample(prompt, max_tokens=100) # max_tokens는 적절히 조절
-                generated_title = title_response.text.strip() if title_response.text else generated_title
+            check_content, test_procedure, expected_result, actual_result_notes, app_version, device = values
 
-            except Exception as llm_error:
+            generated_title = titles[key]
+            if isinstance(generated_title, BaseException):
                 # LLM 호출 실패 시 로그 남기고 기본 타이틀 사용
-                await ctx.warning(f"LLM 제목 생성 실패 (ID: {item_id}): {llm_error}")
+                await ctx.warning(f"LLM 제목 생성 실패 (ID: {item_id}): {generated_title}")
                 llm_failures += 1
-                # generated_title은 기본값으로 유지됨
-
-            report = f'''
-                 **타이틀: {generated_title}**
-
-                 **확인내용**
-                 {row_data.get('확인내용', 'N/A')}
-
-                 **재현 절차**
-                {row_data.get('시험순서', 'N/A')}
-
-                 **기대 결과**
-                {expected_result}
-
-                 **비고**
-                {actual_result_notes}
-
-                ・시험 ID : {item_id}
-                ・어플리케이션 버전 : {row_data.get('어플리케이션 버전', 'N/A')}
-                ・이용단말 : {row_data.get('이용단말', 'N/A')}
-                ---'''
-            report_list.append(report)
-
-        final_report = "\\\\n\\\\n".join(report_list) # 줄바꿈 수정
+                generated_title = DEFAULT_BUG_TITLE
+
+            reports[item_id] = BUG_REPORT_TEMPLATE.format(
+                title=generated_title,
+                check_content=check_content,
+                test_procedure=test_procedure,
+                expected_result=expected_result,
+                notes=actual_result_notes,
+                item_id=item_id,
+                app_version=app_version,
+                device=device,
+            )
+
+        final_report = "\n\n".join([reports[item_id] for item_id in item_ids]) # 줄바꿈 수정
         if llm_failures > 0:
              await ctx.warning(f"총 {llm_failures}개의 항목에 대해 LLM 제목 생성에 실패했습니다.")
 
@@ -296,8 +635,37 @@ EXPECTED_HEADERS = [
     "시험결과", "이용단말", "어플리케이션 버전", "비고", "내부버그DB"
 ]
 
+EXCEL_WRITE_LOCK = asyncio.Lock() # 엑셀 쓰기 직렬화용
+
+def _open_test_item_sheet(xlsx_path: str):
+    """
+    시험 항목 엑셀의 첫 번째 시트를 열어 (워크북, 시트, {헤더: 열 번호})를 반환.
+    파일이 없으면 새로 만들고, 1행에 없는 헤더는 오른쪽 끝에 추가한다.
+    """
+    try:
+        wb = load_workbook(xlsx_path)
+    except FileNotFoundError:
+        wb = Workbook()
+    ws = wb.worksheets[0]
+
+    columns = {cell.value: cell.column for cell in ws[1] if cell.value is not None}
+    next_column = ws.max_column + 1 if columns else 1
+    for header in EXPECTED_HEADERS:
+        if header not in columns:
+            ws.cell(row=1, column=next_column, value=header)
+            columns[header] = next_column
+            next_column += 1
+    return wb, ws, columns
+
+def _to_sheet_row(columns: dict[str, int], values: dict) -> list:
+    """{헤더: 값}을 열 번호 순서의 리스트로 변환 (값이 없는 열은 None)"""
+    row = [None] * max(columns.values())
+    for header, value in values.items():
+        row[columns[header] - 1] = value
+    return row
+
 @mcp.tool()
-def add_test_item_to_excel(
+async def add_test_item_to_excel(
     xlsx_path: str,
     item_id: str,
     check_content: str,
@@ -319,43 +687,41 @@ def add_test_item_to_excel(
     Returns:
         str: 작업 성공 또는 실패 메시지.
     """
+    # 동시에 여러 번 호출되면 읽기-저장 사이에 다른 호출의 행이 덮어써질 수 있으므로 쓰기는 하나씩
+    async with EXCEL_WRITE_LOCK:
+        return await _add_test_item(xlsx_path, item_id, check_content, test_procedure, expected_result)
+
+async def _add_test_item(
+    xlsx_path: str,
+    item_id: str,
+    check_content: str,
+    test_procedure: str,
+    expected_result: str,
+) -> str:
+    """add_test_item_to_excel 본체 (EXCEL_WRITE_LOCK 안에서 호출)"""
     try:
-        df = None
-        # 1. 파일 읽기 시도 (동기)
+        # 1. 워크북 열기 (스레드에서). DataFrame으로 전체를 읽지 않고 시트에 행만 덧붙임
         try:
-            df = pd.read_excel(xlsx_path)
-            # 기존 파일 헤더 확인 및 누락된 헤더 추가
-            missing_headers = [h for h in EXPECTED_HEADERS if h not in df.columns]
-            if missing_headers:
-                 for header in missing_headers:
-                     df[header] = pd.NA
-                 df = df[EXPECTED_HEADERS]
-
-        except FileNotFoundError:
-            df = pd.DataFrame(columns=EXPECTED_HEADERS)
+            wb, ws, columns = await asyncio.to_thread(_open_test_item_sheet, xlsx_path)
         except Exception as read_error:
              return f"❌ 파일 읽기 오류: {read_error}"
 
-        # 2. 새로운 데이터 행 생성 (동일)
+        # 2. 새로운 데이터 행 생성 ('이용단말', '어플리케이션 버전', '비고', '내부버그DB'는 빈 칸)
         new_data = {
             "시험항목ID": item_id,
             "확인내용": check_content,
             "시험순서": test_procedure,
             "기대결과": expected_result,
             "시험결과": "NY",
-            "이용단말": pd.NA,
-            "어플리케이션 버전": pd.NA,
-            "비고": pd.NA,
-            "내부버그DB": pd.NA
         }
-        new_row_df = pd.DataFrame([new_data])
 
-        # 3. 기존 DataFrame에 새 행 추가 (동일)
-        df = pd.concat([df, new_row_df], ignore_index=True)
+        # 3. 헤더 위치에 맞춰 시트 끝에 새 행 추가
+        ws.append(_to_sheet_row(columns, new_data))
 
-        # 4. 수정된 DataFrame을 엑셀 파일로 저장 (동기)
+        # 4. 엑셀 파일로 저장 (스레드에서)
         try:
-            df.to_excel(xlsx_path, index=False, engine='openpyxl')
+            await asyncio.to_thread(wb.save, xlsx_path)
+            _invalidate_xlsx_cache()
             return f"✅ 시험 항목 '{item_id}' 추가 완료."
 
         except Exception as write_error:
@@ -407,26 +773,81 @@ async def recommend_bgm_for_summary(
 
 # --- 유튜브 관련 함수 (내용 복원 및 유지) ---
 
+# Relaxed regex to handle variations like PT#M#S or P#DT#H#M#S (groups: days, hours, minutes, seconds)
+_ISO8601_DURATION_RE = re.compile(r'P(?:(\d+)D)?T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?')
+
 def parse_iso8601_duration(duration_str: str) -> int:
     """Parses ISO 8601 duration string (e.g., PT1H2M3S) and returns total seconds."""
     if not duration_str or duration_str.startswith('P0'): # Handle missing or zero duration
         return 0
-    # Relaxed regex to handle variations like PT#M#S or P#DT#H#M#S
-    match = re.match(
-        r'P(?:(?P<days>\d+)D)?T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?',
-        duration_str
-    )
+    match = _ISO8601_DURATION_RE.match(duration_str)
     if not match:
         return 0 # Or raise an error if needed
 
-    parts = match.groupdict()
-    time_params = {}
-    for name, param in parts.items():
-        if param:
-            time_params[name] = int(param)
+    days, hours, minutes, seconds = (int(part) if part else 0 for part in match.groups())
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
 
-    # timedelta handles days, hours, minutes, seconds directly
-    return int(timedelta(**time_params).total_seconds())
+
+@functools.lru_cache(maxsize=4)
+def _get_youtube_client(api_key: str):
+    """
+    유튜브 API 클라이언트를 키별로 한 번만 생성 (discovery 문서 로드/파싱 비용이 큼).
+    static_discovery=True 로 패키지에 포함된 discovery 문서를 사용해서 네트워크 요청도 없음.
+    """
+    return googleapiclient.discovery.build(
+        "youtube", "v3", developerKey=api_key, cache_discovery=False, static_discovery=True)
+
+# 제목에 들어 있으면 플레이리스트/모음으로 보고 제외할 키워드
+PLAYLIST_KEYWORDS = ["playlist", "플레이리스트", "모음", "mix", "메들리", "medley", "연속듣기", "collection", "트로트"]
+_PLAYLIST_RE = re.compile("|".join(map(re.escape, PLAYLIST_KEYWORDS)), re.IGNORECASE)
+
+YOUTUBE_SEARCH_CACHE_TTL = 3600 # 초
+YOUTUBE_SEARCH_CACHE_SIZE = 256
+_youtube_search_cache: dict[str, tuple[float, list[str]]] = {} # {정규화된 검색어: (만료 시각, 비디오 ID 리스트)}
+
+def _cache_youtube_search(cache_key: str, video_ids: list[str]) -> None:
+    """검색 결과 저장. 가득 차면 만료된 것부터, 그래도 많으면 오래된 것부터 버림"""
+    if len(_youtube_search_cache) >= YOUTUBE_SEARCH_CACHE_SIZE:
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in _youtube_search_cache.items() if expires <= now]:
+            del _youtube_search_cache[key]
+        while len(_youtube_search_cache) >= YOUTUBE_SEARCH_CACHE_SIZE:
+            del _youtube_search_cache[next(iter(_youtube_search_cache))]
+    _youtube_search_cache[cache_key] = (time.monotonic() + YOUTUBE_SEARCH_CACHE_TTL, video_ids)
+
+
+# 영상 길이/조회수는 자주 바뀌지 않으므로 videos.list 결과를 디스크(SQLite)에 보관해 재사용
+YOUTUBE_DETAIL_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "yt_cache.sqlite")
+YOUTUBE_DETAIL_CACHE_TTL = 24 * 3600 # 초
+_CREATE_VIDEO_TABLE = "CREATE TABLE IF NOT EXISTS videos (id TEXT PRIMARY KEY, duration_s INTEGER, views INTEGER, ts REAL)"
+
+def _load_video_details(video_ids: list[str]) -> dict[str, tuple[int, int]]:
+    """캐시에서 TTL 이내의 {비디오 ID: (길이(초), 조회수)}를 읽음. 캐시를 못 쓰면 빈 dict"""
+    placeholders = ",".join("?" * len(video_ids))
+    try:
+        with closing(sqlite3.connect(YOUTUBE_DETAIL_CACHE_PATH)) as conn:
+            conn.execute(_CREATE_VIDEO_TABLE)
+            rows = conn.execute(
+                f"SELECT id, duration_s, views FROM videos WHERE id IN ({placeholders}) AND ts > ?",
+                (*video_ids, time.time() - YOUTUBE_DETAIL_CACHE_TTL),
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"Warning: YouTube 캐시 읽기 실패: {e}")
+        return {}
+    return {video_id: (duration_sec, view_count) for video_id, duration_sec, view_count in rows}
+
+def _save_video_details(details: dict[str, tuple[int, int]]) -> None:
+    """조회한 {비디오 ID: (길이(초), 조회수)}를 캐시에 저장. 실패해도 검색은 계속"""
+    now = time.time()
+    try:
+        with closing(sqlite3.connect(YOUTUBE_DETAIL_CACHE_PATH)) as conn, conn:
+            conn.execute(_CREATE_VIDEO_TABLE)
+            conn.executemany(
+                "INSERT OR REPLACE INTO videos (id, duration_s, views, ts) VALUES (?, ?, ?, ?)",
+                [(video_id, duration_sec, view_count, now) for video_id, (duration_sec, view_count) in details.items()],
+            )
+    except sqlite3.Error as e:
+        print(f"Warning: YouTube 캐시 저장 실패: {e}")
 
 
 async def get_youtube_search_result(query: str, api_key: str) -> tuple[list[str], str | None]:
@@ -438,14 +859,19 @@ async def get_youtube_search_result(query: str, api_key: str) -> tuple[list[str]
     if not api_key:
         return [], "YouTube API 키가 설정되지 않았습니다."
 
-    PLAYLIST_KEYWORDS = ["playlist", "플레이리스트", "모음", "mix", "메들리", "medley", "연속듣기", "collection", "트로트"]
+    # 같은 검색어는 TTL 동안 캐시된 결과 사용 (search.list 한 번에 쿼터 100 소모)
+    cache_key = query.strip().casefold()
+    cached = _youtube_search_cache.get(cache_key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1], None
+
     MIN_DURATION_SEC = 180 # 3분
     MAX_DURATION_SEC = 300 # 5분
     MIN_VIEW_COUNT = 10000 # 1만 조회수
+    MAX_RESULTS = 5 # 반환할 최대 비디오 수
 
     try:
-        youtube = googleapiclient.discovery.build(
-            "youtube", "v3", developerKey=api_key)
+        youtube = _get_youtube_client(api_key)
 
         # 1. 초기 검색 (ID와 제목)
         search_request = youtube.search().list(
@@ -453,19 +879,19 @@ async def get_youtube_search_result(query: str, api_key: str) -> tuple[list[str]
             q=query,
             type="video",
             maxResults=20, # 필터링 위해 결과 수 증가
-            relevanceLanguage="ko"
+            relevanceLanguage="ko",
+            fields="items(id(kind,videoId),snippet/title)" # 필요한 필드만 응답받음
         )
-        search_response = await asyncio.to_thread(search_request.execute)
+        # 클라이언트는 공유하지만 httplib2.Http는 스레드 안전하지 않으므로 요청마다 새로 만들어 실행
+        search_response = await asyncio.to_thread(search_request.execute, http=build_http())
 
         potential_video_ids = []
         if search_response.get("items"):
             for item in search_response["items"]:
                 if item["id"]["kind"] == "youtube#video":
                     video_id = item["id"]["videoId"]
-                    title = item["snippet"]["title"].lower()
-                    # 2. 플레이리스트 키워드 필터링
-                    is_playlist = any(keyword in title for keyword in PLAYLIST_KEYWORDS)
-                    if not is_playlist:
+                    # 2. 플레이리스트 키워드 필터링 (대소문자 무시, 제목을 한 번만 훑음)
+                    if not _PLAYLIST_RE.search(item["snippet"]["title"]):
                         potential_video_ids.append(video_id)
 
         if not potential_video_ids:
@@ -474,44 +900,54 @@ async def get_youtube_search_result(query: str, api_key: str) -> tuple[list[str]
         # 3. 영상 상세 정보 조회 (길이 및 조회수)
         final_video_ids = []
         for i in range(0, len(potential_video_ids), 50):
+            if len(final_video_ids) >= MAX_RESULTS: # 이미 충분히 모였으면 남은 배치는 조회하지 않음
+                break
             batch_ids = potential_video_ids[i:i+50]
-            try:
-                video_details_request = youtube.videos().list(
-                    part="contentDetails,statistics", # statistics 추가
-                    id=",".join(batch_ids)
-                )
-                video_details_response = await asyncio.to_thread(video_details_request.execute)
-
-                if video_details_response.get("items"):
-                    for item in video_details_response["items"]:
-                        video_id = item["id"]
-                        details = item.get("contentDetails", {})
-                        stats = item.get("statistics", {}) # statistics 정보 가져오기
-
-                        duration_str = details.get("duration")
-                        view_count_str = stats.get("viewCount") # 조회수 문자열
 
+            # 최근에 조회한 영상은 디스크 캐시에서 가져오고, 나머지만 API로 조회
+            details = await asyncio.to_thread(_load_video_details, batch_ids)
+            missing_ids = [video_id for video_id in batch_ids if video_id not in details]
+            if missing_ids:
+                try:
+                    video_details_request = youtube.videos().list(
+                        part="contentDetails,statistics", # statistics 추가
+                        id=",".join(missing_ids),
+                        fields="items(id,contentDetails/duration,statistics/viewCount)" # 길이와 조회수만
+                    )
+                    video_details_response = await asyncio.to_thread(video_details_request.execute, http=build_http())
+
+                    fetched = {}
+                    for item in video_details_response.get("items", []):
+                        video_id = item["id"]
+                        duration_str = item.get("contentDetails", {}).get("duration")
+                        view_count_str = item.get("statistics", {}).get("viewCount") # 조회수 문자열
                         if duration_str and view_count_str:
-                            # 4. 길이 필터링
-                            duration_sec = parse_iso8601_duration(duration_str)
-                            if MIN_DURATION_SEC <= duration_sec <= MAX_DURATION_SEC:
-                                # 5. 조회수 필터링
-                                try:
-                                    view_count = int(view_count_str)
-                                    if view_count >= MIN_VIEW_COUNT:
-                                        final_video_ids.append(video_id)
-                                except ValueError:
-                                    # viewCount가 숫자가 아닌 경우 무시
-                                    print(f"Warning: Could not parse view count for video {video_id}: {view_count_str}")
-                                    continue
-
-            except googleapiclient.errors.HttpError as batch_error:
-                 print(f"Error fetching details for batch {i//50 + 1}: {batch_error}")
-                 continue
-
-        # 6. 최종 결과 반환 (최대 5개)
+                            try:
+                                fetched[video_id] = (parse_iso8601_duration(duration_str), int(view_count_str))
+                            except ValueError:
+                                # viewCount가 숫자가 아닌 경우 무시
+                                print(f"Warning: Could not parse view count for video {video_id}: {view_count_str}")
+                    if fetched:
+                        details.update(fetched)
+                        await asyncio.to_thread(_save_video_details, fetched)
+
+                except googleapiclient.errors.HttpError as batch_error:
+                     print(f"Error fetching details for batch {i//50 + 1}: {batch_error}")
+
+            for video_id in batch_ids: # 검색 결과 순서 유지
+                if video_id not in details:
+                    continue
+                duration_sec, view_count = details[video_id]
+                # 4. 길이 필터링, 5. 조회수 필터링
+                if MIN_DURATION_SEC <= duration_sec <= MAX_DURATION_SEC and view_count >= MIN_VIEW_COUNT:
+                    final_video_ids.append(video_id)
+                    if len(final_video_ids) >= MAX_RESULTS:
+                        break
+
+        # 6. 최종 결과 반환 (최대 MAX_RESULTS개)
         if final_video_ids:
-            return final_video_ids[:5], None
+            _cache_youtube_search(cache_key, final_video_ids)
+            return final_video_ids, None
         else:
             return [], "검색 결과에 조건(3~5분, 1만뷰 이상, 단일 곡)에 맞는 비디오가 없습니다." # 메시지 업데이트
 
@@ -4,10 +4,19 @@ FastMCP myMcp Server (日本語版)
 
 from fastmcp import FastMCP, Context
 import httpx
+import orjson
 import pandas as pd
+from openpyxl import Workbook, load_workbook
 import os
 from dotenv import load_dotenv
 import asyncio
+import functools
+import io
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 
 load_dotenv() # .env ファイルから環境変数をロード
 
@@ -20,11 +29,10 @@ NOTION_VERSION = os.getenv("NOTION_VERSION")
 if not NOTION_TOKEN or not DATABASE_ID or not NOTION_VERSION:
     raise ValueError("エラー: .env ファイルから Notion 関連の環境変数が見つかりません。(.env ファイルの作成と内容を確認してください)")
 
-# 許可されたステータス値リスト
-ALLOWED_STATUS_VALUES = ["NY", "NG", "BK", "QA", "OK", "진행중"] # "진행중" は Notion 側の値に合わせて変更が必要な場合があります
-
-# サーバー作成
-mcp = FastMCP("myMCP Server (JP)") # サーバー名を変更 (任意)
+# 許可されたステータス値 (判定はfrozensetで、エラーメッセージ用の文字列は事前に作っておく)
+_STATUS_CHOICES = ("NY", "NG", "BK", "QA", "OK", "진행중") # "진행중" は Notion 側の値に合わせて変更が必要な場合があります
+ALLOWED_STATUS_VALUES = frozenset(_STATUS_CHOICES)
+ALLOWED_STATUS_STR = ", ".join(_STATUS_CHOICES)
 
 headers = {
     "Authorization": f"Bearer {NOTION_TOKEN}",
@@ -32,63 +40,170 @@ headers = {
     "Content-Type": "application/json"
 }
 
+# Notion API用の共有クライアント (ツール呼び出しのたびにTCP/TLSハンドシェイクを繰り返さないよう再利用)
+_notion_client: httpx.AsyncClient | None = None
+
+def _get_notion_client() -> httpx.AsyncClient:
+    """共有クライアントを返す。初回使用時に作成し、lifespan終了で閉じられていれば作り直す。"""
+    global _notion_client
+    # 作成までawaitがないので、イベントループ内で二重に作られることはなくLockは不要
+    if _notion_client is None or _notion_client.is_closed:
+        _notion_client = httpx.AsyncClient(
+            base_url="https://api.notion.com/v1",
+            headers=headers,
+            # transportを渡すとクライアント側の http2/limits は使われないので、transport側で指定
+            # retries は接続の確立に失敗したとき (ConnectError/ConnectTimeout) の再試行。429/5xx の再試行は _notion_post で行う
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+                retries=3,
+            ),
+            timeout=httpx.Timeout(10.0, connect=5.0),
+        )
+    return _notion_client
+
+
+# lifespan はSSE接続ごとに入るので、開いているセッション数を数えて最後のセッションが終わるときだけクライアントを閉じる
+# (他のセッションで実行中のNotionリクエストが切断されないように)
+_active_sessions = 0
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """最後のセッション (またはサーバー) の終了時に共有HTTPクライアントを閉じる。"""
+    global _active_sessions
+    _active_sessions += 1
+    try:
+        yield
+    finally:
+        _active_sessions -= 1
+        if _active_sessions == 0 and _notion_client is not None:
+            await _notion_client.aclose()
+
+
+# サーバー作成
+mcp = FastMCP("myMCP Server (JP)", lifespan=lifespan) # サーバー名を変更 (任意)
+
+NOTION_PAGE_SIZE = 100 # Notionクエリ1回あたりの最大件数
+NOTION_RETRY_STATUS = frozenset({429, 502, 503, 504}) # 読み込みリクエストで再試行するレスポンスコード (レート制限、一時的なサーバーエラー)
+# ページ作成は冪等ではなく、502/504 は作成済みの後に返ることもある → 未処理が確実な 429 だけ再試行 (重複作成を防ぐ)
+NOTION_CREATE_RETRY_STATUS = frozenset({429})
+NOTION_MAX_ATTEMPTS = 5
+
+async def _notion_post(path: str, retry_status: frozenset[int], **kwargs) -> httpx.Response:
+    """
+    共有クライアントでNotionにPOSTする。
+    レスポンスコードが retry_status に含まれていれば指数バックオフ (+ジッター) で再試行し、Retry-After ヘッダーがあればその値に従う。
+    """
+    for attempt in range(1, NOTION_MAX_ATTEMPTS + 1):
+        response = await _get_notion_client().post(path, **kwargs)
+        if response.status_code not in retry_status or attempt == NOTION_MAX_ATTEMPTS:
+            return response
+
+        try:
+            delay = float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            delay = min(2 ** (attempt - 1), 8) + random.random() * 0.3
+        await asyncio.sleep(delay)
+
+async def _query_notion_database() -> list[dict]:
+    """
+    next_cursorをたどってデータベースの全ページを取得する。(1回のクエリでは最大100件しか返らないため)
+    """
+    results = []
+    body = {"page_size": NOTION_PAGE_SIZE}
+    while True:
+        response = await _notion_post(f"/databases/{DATABASE_ID}/query", NOTION_RETRY_STATUS, content=orjson.dumps(body))
+        response.raise_for_status()
+
+        data = orjson.loads(response.content) # ページが多いとJSONのパースコストが大きいので orjson を使用
+        results.extend(data.get("results", []))
+        if not data.get("has_more") or not data.get("next_cursor"):
+            return results
+        body = {"page_size": NOTION_PAGE_SIZE, "start_cursor": data["next_cursor"]}
+
+# read_notion_database の結果キャッシュ。短時間に繰り返し読む場合はネットワークリクエストなしで返す (書き込み成功時に破棄)
+NOTION_READ_CACHE_TTL = float(os.getenv("NOTION_READ_CACHE_TTL", "30")) # 秒
+_notion_read_cache: dict[str, tuple[float, str]] = {} # {データベースID: (保存時刻, 出力文字列)}
+
+# Notion DBのプロパティ名 (Notion DBスキーマに依存するため元の韓国語のまま)
+_TITLE, _TEXT, _DATE, _STATUS, _ASSIGNEE = "제목", "텍스트", "날짜", "상태", "담당자"
+_EMPTY: dict = {}
+
+# 出力1行の書式 (日本語ラベル)。format をバインドしておき、ページごとに呼ぶ
+_format_line = "[{}] {} - {}(ステータス: {}, 担当者: {})".format
+
+def _format_pages(pages: list[dict]) -> str:
+    """Notionページのリストを1ページ1行の '[日付] タイトル - テキスト(ステータス, 担当者)' に変換"""
+    # 先にフィールドごとのリストに値を抜き出してから、まとめて整形する
+    dates, titles, texts, statuses, assignees = [], [], [], [], []
+    for page in pages:
+        props = page.get("properties", _EMPTY)
+
+        # 値の抽出
+        titles.append(t[0]["text"]["content"] if (t := props.get(_TITLE, _EMPTY).get("title")) else "タイトルなし")
+        texts.append(t[0]["text"]["content"] if (t := props.get(_TEXT, _EMPTY).get("rich_text")) else "-")
+        dates.append((props.get(_DATE, _EMPTY).get("date") or _EMPTY).get("start") or "-")
+        statuses.append((props.get(_STATUS, _EMPTY).get("status") or _EMPTY).get("name") or "-") # Statusタイプ
+
+        # '担当者' は人物(people)プロパティを優先し、なければテキストプロパティ
+        assignee_prop = props.get(_ASSIGNEE, _EMPTY)
+        if people := assignee_prop.get("people"):
+            assignees.append(", ".join([person.get("name", "名前なし") for person in people if person]))
+        elif rich_text := assignee_prop.get("rich_text"):
+            assignees.append(rich_text[0]["text"]["content"])
+        else:
+            assignees.append("-")
+
+    return "\n".join(map(_format_line, dates, titles, texts, statuses, assignees))
+
 @mcp.tool()
 async def read_notion_database() -> str:
     """Notionデータベースの内容を非同期で取得するMCPツール (ステータス、担当者を含む)"""
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    async with httpx.AsyncClient() as client:
+    cached = _notion_read_cache.get(DATABASE_ID)
+    if cached and time.monotonic() - cached[0] < NOTION_READ_CACHE_TTL:
+        return cached[1]
+
+    try:
+        results = await _query_notion_database()
+        output = _format_pages(results) if results else "データベースは空です。"
+        _notion_read_cache[DATABASE_ID] = (time.monotonic(), output)
+        return output
+
+    except httpx.HTTPStatusError as e:
+        error_details = e.response.text
         try:
-            response = await client.post(url, headers=headers)
-            response.raise_for_status()
-
-            results = response.json().get("results", [])
-            output_lines = []
-            for page in results:
-                props = page.get("properties", {})
-
-                # 値の抽出
-                title_prop = props.get("제목", {}).get("title", []) # Notionプロパティ名「제목」
-                title = title_prop[0]["text"]["content"] if title_prop else "タイトルなし"
-
-                text_prop = props.get("텍스트", {}).get("rich_text", []) # Notionプロパティ名「텍스트」
-                text = text_prop[0]["text"]["content"] if text_prop else "-"
-
-                date_prop = props.get("날짜", {}).get("date") # Notionプロパティ名「날짜」
-                date = date_prop["start"] if date_prop and date_prop.get("start") else "-"
-
-                # 'ステータス' プロパティの読み取り (Statusタイプ) - Notionプロパティ名「상태」
-                status_prop = props.get("상태", {}).get("status") # 'status' キーを使用
-                status = status_prop["name"] if status_prop and status_prop.get("name") else "-"
-
-                # '担当者' プロパティの読み取り - Notionプロパティ名「담당자」
-                assignee_prop = props.get("담당자", {}).get("people", [])
-                if assignee_prop:
-                    assignee = ", ".join([person.get("name", "名前なし") for person in assignee_prop if person])
-                else:
-                    assignee_prop = props.get("담당자", {}).get("rich_text", [])
-                    if assignee_prop:
-                         assignee = assignee_prop[0]["text"]["content"] if assignee_prop else "-"
-                    else:
-                        assignee = "-"
-
-                # 出力文字列 (日本語ラベルに変更)
-                output_lines.append(f"[{date}] {title} - {text}(ステータス: {status}, 担当者: {assignee})")
-
-            return "\n".join(output_lines) if output_lines else "データベースは空です。"
-
-        except httpx.HTTPStatusError as e:
-            error_details = e.response.text
-            try:
-                notion_error = e.response.json()
-                error_details = notion_error.get("message", error_details)
-            except Exception:
-                pass
-            return f"❌ 読み込み失敗! ステータスコード {e.response.status_code}. 理由: {error_details}"
-        except httpx.RequestError as e:
-            return f"❌ 読み込み失敗! ネットワークエラー: {e}"
-        except Exception as e:
-            # エラーメッセージを具体的に
-            return f"❌ read_notion_database で予期せぬエラー: {e}"
+            notion_error = orjson.loads(e.response.content)
+            error_details = notion_error.get("message", error_details)
+        except Exception:
+            pass
+        return f"❌ 読み込み失敗! ステータスコード {e.response.status_code}. 理由: {error_details}"
+    except httpx.RequestError as e:
+        return f"❌ 読み込み失敗! ネットワークエラー: {e}"
+    except Exception as e:
+        # エラーメッセージを具体的に
+        return f"❌ read_notion_database で予期せぬエラー: {e}"
+
+@mcp.tool()
+def invalidate_notion_cache() -> str:
+    """
+    read_notion_database のキャッシュを破棄するMCPツール。
+    Notion上で直接編集した内容を、キャッシュの有効期限 (NOTION_READ_CACHE_TTL) を待たずに反映したいときに使用。
+    """
+    _notion_read_cache.clear()
+    return "✅ Notionの読み込みキャッシュを破棄しました。"
+
+def _build_page_properties(title: str, text: str, date: str, status: str, assignee: str | None) -> dict:
+    """新しいページの properties 本体を作成 (担当者は指定されたときだけ追加)"""
+    properties = {
+        _TITLE: {"title": [{"text": {"content": title}}]},
+        _TEXT: {"rich_text": [{"text": {"content": text}}]},
+        _DATE: {"date": {"start": date}},
+        _STATUS: {"status": {"name": status}},
+    }
+    if assignee is not None:
+        # 担当者プロパティはNotionから取得する必要があるが、今回はテキストとして設定
+        properties[_ASSIGNEE] = {"rich_text": [{"text": {"content": assignee}}]}
+    return properties
 
 @mcp.tool()
 async def add_notion_page(
@@ -103,61 +218,204 @@ async def add_notion_page(
     ステータスが指定されていない場合は 'NY' を使用。
     担当者が指定されている場合はその値を設定し、指定されていない場合は設定しない。
     """
-    url = "https://api.notion.com/v1/pages"
-
     # ステータス値の処理: なければ 'NY' を使用、あればチェック
     final_state = status if status is not None else "NY"
 
     if final_state not in ALLOWED_STATUS_VALUES:
         # エラーメッセージを日本語に
-        return f"❌ 追加失敗! 'ステータス' の値は {', '.join(ALLOWED_STATUS_VALUES)} のいずれかである必要があります。入力値: {final_state}"
-
-    # Notionプロパティ名は元の韓国語のまま（Notion DBスキーマに依存するため）
-    properties_payload = {
-        "제목": {"title": [{"text": {"content": title}}]},
-        "텍스트": {"rich_text": [{"text": {"content": text}}]},
-        "날짜": {"date": {"start": date}},
-        "상태": {"status": {"name": final_state}},
-    }
-
-    # 担当者の値があれば追加
-    if assignee is not None:
-        # 担当者プロパティはNotionから取得する必要があるが、今回はテキストとして設定
-        properties_payload["담당자"] = {"rich_text": [{"text": {"content": assignee}}]}
+        return f"❌ 追加失敗! 'ステータス' の値は {ALLOWED_STATUS_STR} のいずれかである必要があります。入力値: {final_state}"
 
+    properties_payload = _build_page_properties(title, text, date, final_state, assignee)
     data = {
         "parent": { "database_id": DATABASE_ID },
         "properties": properties_payload
     }
 
-    async with httpx.AsyncClient() as client:
+    try:
+        # orjsonでシリアライズしてバイト列のまま送信 (Content-Typeは共通ヘッダーに設定済み)
+        response = await _notion_post("/pages", NOTION_CREATE_RETRY_STATUS, content=orjson.dumps(data))
+        response.raise_for_status()
+        _notion_read_cache.clear() # 新しいページがすぐ見えるように読み込みキャッシュを破棄
+
+        # 成功メッセージ更新 (担当者設定の有無を表示)
+        assignee_jp = f"担当者: {assignee}" if assignee is not None else "担当者 未指定"
+        return f"✅ 登録成功! (ステータス: {final_state}, {assignee_jp})"
+
+    except httpx.HTTPStatusError as e:
+        error_details = e.response.text
         try:
-            response = await client.post(url, headers=headers, json=data)
-            response.raise_for_status()
-
-            # 成功メッセージ更新 (担当者設定の有無を表示)
-            assignee_jp = f"担当者: {assignee}" if assignee is not None else "担当者 未指定"
-            return f"✅ 登録成功! (ステータス: {final_state}, {assignee_jp})"
-
-        except httpx.HTTPStatusError as e:
-            error_details = e.response.text
-            try:
-                notion_error = e.response.json()
-                error_details = notion_error.get("message", error_details)
-            except Exception:
-                pass
-            # エラーメッセージを日本語に
-            return (f"❌ 追加失敗! ステータスコード {e.response.status_code}. 理由: {error_details}\\n"
-                    f"送信されたデータ: {properties_payload}") # データ表示はデバッグ用に残すことも可
-        except httpx.RequestError as e:
-             # エラーメッセージを日本語に
-            return f"❌ 追加失敗! ネットワークエラー: {e}"
-        except Exception as e:
-             # エラーメッセージを日本語に
-            return f"❌ 追加失敗! 予期せぬエラー: {e}"
+            notion_error = orjson.loads(e.response.content)
+            error_details = notion_error.get("message", error_details)
+        except Exception:
+            pass
+        # エラーメッセージを日本語に
+        return (f"❌ 追加失敗! ステータスコード {e.response.status_code}. 理由: {error_details}\n"
+                f"送信されたデータ: {properties_payload}") # データ表示はデバッグ用に残すことも可
+    except httpx.RequestError as e:
+         # エラーメッセージを日本語に
+        return f"❌ 追加失敗! ネットワークエラー: {e}"
+    except Exception as e:
+         # エラーメッセージを日本語に
+        return f"❌ 追加失敗! 予期せぬエラー: {e}"
+
+NOTION_WRITE_CONCURRENCY = 8 # 一括追加時に同時に送るリクエスト数
+
+async def _create_notion_page(sem: asyncio.Semaphore, data: dict) -> None:
+    """ページを1件作成 (失敗時は例外を送出)"""
+    async with sem:
+        response = await _notion_post("/pages", NOTION_CREATE_RETRY_STATUS, content=orjson.dumps(data))
+    response.raise_for_status()
+
+def _describe_notion_error(e: BaseException) -> str:
+    """Notionリクエストの例外をユーザー向けメッセージに変換"""
+    if isinstance(e, httpx.HTTPStatusError):
+        error_details = e.response.text
+        try:
+            error_details = orjson.loads(e.response.content).get("message", error_details)
+        except Exception:
+            pass
+        return f"ステータスコード {e.response.status_code}. 理由: {error_details}"
+    if isinstance(e, httpx.RequestError):
+        return f"ネットワークエラー: {e}"
+    return f"予期せぬエラー: {e}"
 
 @mcp.tool()
-def find_ng_items_without_bug_id(xlsx_path: str, sheet_name: str = None) -> list[str]:
+async def add_notion_pages(items: list[dict]) -> str:
+    """
+    Notionに複数のタスクを一度に追加するMCPツール。
+    リクエストは最大 NOTION_WRITE_CONCURRENCY 件ずつ同時に送信。
+
+    Args:
+        items (list[dict]): 追加するタスクのリスト。
+            各項目には 'title', 'text', 'date' キーが必要で、'status' (デフォルト 'NY') と 'assignee' は任意。
+
+    Returns:
+        str: 全体の結果概要と、失敗した項目ごとの理由。
+    """
+    failures = {} # {項目番号: 失敗メッセージ}
+    labels = []
+    payloads = []
+    for i, item in enumerate(items, start=1):
+        label = f"{i}件目({item.get('title', 'タイトルなし')})"
+        missing = [key for key in ("title", "text", "date") if key not in item]
+        if missing:
+            failures[i] = f"❌ {label}: 必須キー不足 {missing}"
+            continue
+
+        status = item.get("status")
+        final_state = status if status is not None else "NY"
+        if final_state not in ALLOWED_STATUS_VALUES:
+            failures[i] = f"❌ {label}: 'ステータス' の値は {ALLOWED_STATUS_STR} のいずれかである必要があります。入力値: {final_state}"
+            continue
+
+        labels.append((i, label))
+        payloads.append({
+            "parent": { "database_id": DATABASE_ID },
+            "properties": _build_page_properties(item["title"], item["text"], item["date"], final_state, item.get("assignee")),
+        })
+
+    sem = asyncio.Semaphore(NOTION_WRITE_CONCURRENCY)
+    results = await asyncio.gather(*[_create_notion_page(sem, data) for data in payloads], return_exceptions=True)
+    for (i, label), result in zip(labels, results):
+        if isinstance(result, BaseException):
+            failures[i] = f"❌ {label}: {_describe_notion_error(result)}"
+    if not all(isinstance(result, BaseException) for result in results):
+        _notion_read_cache.clear() # 1件でも追加されたら読み込みキャッシュを破棄
+
+    summary = f"✅ 合計 {len(items)} 件中 {len(items) - len(failures)} 件登録成功"
+    return "\n".join([summary, *(failures[i] for i in sorted(failures))]) if failures else summary
+
+# --- Excel関連 ---
+# 読み込みはRust製のcalamineエンジンを優先して使う (なければopenpyxlで代用)、書き込みはopenpyxl
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_READ_ENGINE = "calamine"
+except ImportError:
+    EXCEL_READ_ENGINE = "openpyxl"
+
+# pyarrowがあれば文字列カラムをArrowベースで読む (セルごとにPythonのstrオブジェクトを作らず、.str 演算もArrowのカーネルで処理)
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+# これより大きいファイルはキャッシュしない (元のバイト列 + ExcelFile をプロセスが持ち続けることになるため) (bytes)
+LARGE_XLSX_THRESHOLD = 20 * 1024 * 1024
+
+# 1つのExcelFileを複数スレッドから同時に parse するのは安全ではないので、parse は1つずつ
+_excel_parse_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=4)
+def _open_excel(path: str, mtime_ns: int, size: int) -> pd.ExcelFile:
+    """
+    xlsxファイルを開いてExcelFileとしてキャッシュ (zipの目録やshared stringsのパースはファイルごとに1回)。
+    ファイルが更新されると更新時刻・サイズが変わってキーが変わるので、開き直す。
+    ファイルハンドルを掴んだままだとWindowsで保存できなくなるため、内容をメモリに読み込んでから開く。
+    """
+    with open(path, "rb") as f:
+        return pd.ExcelFile(io.BytesIO(f.read()), engine=EXCEL_READ_ENGINE)
+
+def _parse_options(sheet_name: str | None, columns, dtype) -> dict:
+    """ExcelFile.parse / pd.read_excel に渡す共通オプション"""
+    return dict(
+        # sheet_name=None だと pandas は全シートを dict で返すので、最初のシート(0)に置き換えて読む
+        sheet_name=0 if sheet_name is None else sheet_name,
+        # 存在しないカラムが混ざっていても例外にならないよう callable で渡す (カラムの存在確認は呼び出し側で)
+        usecols=(lambda col: col in columns) if columns else None,
+        dtype=dtype,
+    )
+
+def _read_excel(xlsx_path: str, sheet_name: str | None = None, columns: list[str] | None = None, dtype=None) -> pd.DataFrame:
+    """
+    キャッシュしたExcelFileからシートを読む (省略時は最初のシート)。
+    columns を指定するとそのカラムだけパースする。
+    LARGE_XLSX_THRESHOLD より大きいファイルはキャッシュせず、毎回読み込む。
+    """
+    path = os.path.abspath(xlsx_path)
+    st = os.stat(path)
+    if st.st_size > LARGE_XLSX_THRESHOLD:
+        return pd.read_excel(path, engine=EXCEL_READ_ENGINE, **_parse_options(sheet_name, columns, dtype))
+    xl = _open_excel(path, st.st_mtime_ns, st.st_size)
+    with _excel_parse_lock:
+        return xl.parse(**_parse_options(sheet_name, columns, dtype))
+
+# find_ng_items_without_bug_id で使うカラム (カラム名はExcelファイルに合わせる)
+NG_ITEM_COLUMNS = ["試験項目ID", "試験結果", "内部バグDB"]
+# IDとバグIDは文字列、'試験結果' は値の種類が少ないので category で読む (比較が軽くなり、欠損があってもboolで返る)
+NG_ITEM_DTYPES = {"試験項目ID": STRING_DTYPE, "試験結果": "category", "内部バグDB": STRING_DTYPE}
+
+def _scan_ng_items(xlsx_path: str, sheet_name: str | None = None) -> list[str]:
+    """
+    openpyxlのread-onlyモードで1行ずつ読みながら、find_ng_items_without_bug_id と同じ条件の試験項目IDを集める。
+    シート全体をメモリに載せないので、メモリ使用量がファイルサイズに依存しない。
+    """
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0] if sheet_name is None else wb[sheet_name]
+        rows = ws.iter_rows(values_only=True)
+        header = {name: i for i, name in enumerate(next(rows, ())) if name is not None}
+
+        # 必須カラムの確認
+        for col in NG_ITEM_COLUMNS:
+            if col not in header:
+                return [f"❌ '{col}' カラムが存在しません。確認してください。"]
+        i_id, i_result, i_bug = (header[col] for col in NG_ITEM_COLUMNS)
+        width = max(i_id, i_result, i_bug) + 1
+
+        ng_ids = []
+        for row in rows:
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            bug_id = row[i_bug]
+            if row[i_result] == "NG" and row[i_id] is not None and (bug_id is None or str(bug_id).strip() == ""):
+                ng_ids.append(str(row[i_id]))
+        return ng_ids
+    finally:
+        wb.close()
+
+@mcp.tool()
+async def find_ng_items_without_bug_id(xlsx_path: str, sheet_name: str = None) -> list[str]:
     """
     xlsxファイルで '試験結果' が 'NG' であり、'内部バグDB' が空の項目の '試験項目ID' をリストで返します。
     つまり、JIRA に登録されていない項目を通知します。
@@ -173,28 +431,66 @@ def find_ng_items_without_bug_id(xlsx_path: str, sheet_name: str = None) -> list
 
 
     try:
-        df = pd.read_excel(xlsx_path, sheet_name=sheet_name)
+        # calamineがなければ、openpyxlでDataFrameを作らずに行単位でストリーミングする
+        if EXCEL_READ_ENGINE != "calamine":
+            return await asyncio.to_thread(_scan_ng_items, xlsx_path, sheet_name)
+
+        # 読み込みはブロッキング処理なので別スレッドで実行
+        # 必要な3カラムだけを、型推論なしで NG_ITEM_DTYPES の型として読む
+        df = await asyncio.to_thread(_read_excel, xlsx_path, sheet_name, columns=NG_ITEM_COLUMNS, dtype=NG_ITEM_DTYPES)
 
         # 必須カラムの確認 (カラム名はExcelファイルに合わせる)
-        required_columns = ["試験項目ID", "試験結果", "内部バグDB"]
-        for col in required_columns:
+        for col in NG_ITEM_COLUMNS:
             if col not in df.columns:
                 # エラーメッセージを日本語に
                 return [f"❌ '{col}' カラムが存在しません。確認してください。"]
 
-        # フィルタリング (カラム名はExcelファイルに合わせる)
-        filtered = df[
-            (df["試験結果"] == "NG") &
-            (df["内部バグDB"].isnull() | (df["内部バグDB"].astype(str).str.strip() == ""))
-        ]
+        # フィルタリング: '試験結果' が NG かつ '内部バグDB' が空 (NaN または空白のみ)
+        # 文字列処理(strip)はコストが大きいので NG の行に対してだけ行う (文字列型で読んでいるので astype は不要)
+        is_ng = (df["試験結果"] == "NG").to_numpy(dtype=bool)
+        no_bug_id = (df["内部バグDB"][is_ng].fillna("").str.strip() == "").to_numpy(dtype=bool)
 
-        return filtered["試験項目ID"].dropna().astype(str).tolist()
+        return df["試験項目ID"][is_ng][no_bug_id].dropna().tolist()
 
     except Exception as e:
         # エラーメッセージを日本語に
         return [f"❌ エラー発生: {e}"]
 
 
+LLM_CONCURRENCY = 5 # 同時に送るLLMリクエスト数
+DEFAULT_BUG_TITLE = "仮タイトル" # LLMタイトル生成失敗時のデフォルト値
+BUG_TITLE_CACHE_SIZE = 256
+
+# (期待結果, 備考) → LLMが生成したタイトル。長く使われていないものから捨てる (LRU)
+_bug_title_cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+
+def _get_cached_bug_title(key: tuple[str, str]) -> str | None:
+    title = _bug_title_cache.get(key)
+    if title is not None:
+        _bug_title_cache.move_to_end(key)
+    return title
+
+def _cache_bug_title(key: tuple[str, str], title: str) -> None:
+    _bug_title_cache[key] = title
+    _bug_title_cache.move_to_end(key)
+    if len(_bug_title_cache) > BUG_TITLE_CACHE_SIZE:
+        _bug_title_cache.popitem(last=False)
+
+async def _generate_bug_title(ctx: Context, sem: asyncio.Semaphore, expected_result, actual_result_notes) -> str:
+    """'期待結果' と '備考' を基に、LLMにバグレポートのタイトルを依頼"""
+    prompt = f'''以下の情報に基づいて、バグレポートのタイトルを「期待結果はAだったが、実際の結果はBだった」という形式で簡潔に作成してください:
+
+                期待結果: {expected_result}
+                実際の結果または備考: {actual_result_notes}
+
+                タイトル:'''
+    async with sem:
+        title_response = await ctx.sample(prompt, max_tokens=100) # max_tokens は適切に調整
+    return title_response.text.strip() if title_response.text else DEFAULT_BUG_TITLE
+
+# バグレポートで使うExcelカラム (このカラムだけ読む)
+BUG_REPORT_COLUMNS = ["試験項目ID", "確認内容", "試験手順", "期待結果", "備考", "アプリケーションバージョン", "利用端末"]
+
 @mcp.tool()
 async def generate_bug_reports_from_ids(xlsx_path: str, item_ids: list[str], ctx: Context) -> str:
     """
@@ -212,42 +508,48 @@ async def generate_bug_reports_from_ids(xlsx_path: str, item_ids: list[str], ctx
 
     try:
         # ctxのメソッドはほとんど非同期なので、非同期にするのが良い
-        df = await asyncio.to_thread(pd.read_excel, xlsx_path)
+        df = await asyncio.to_thread(_read_excel, xlsx_path, columns=BUG_REPORT_COLUMNS, dtype=str)
         report_list = []
         llm_failures = 0 # LLM呼び出し失敗回数
 
-        for item_id in item_ids:
-            # カラム名はExcelファイルに合わせる
-            row = df[df["試験項目ID"] == item_id]
-            if row.empty:
+        # IDごとに全行をスキャンしないよう、試験項目IDでインデックスを張って一度に引く (重複IDは最初の行を使用)
+        indexed = df[~df["試験項目ID"].duplicated()].set_index("試験項目ID")
+        found = indexed.index.get_indexer(item_ids) != -1
+        rows = indexed.reindex(item_ids)
+        entries = [(item_id, row_data if is_found else None) for (item_id, row_data), is_found in zip(rows.iterrows(), found)]
+
+        # プロンプトは (期待結果, 備考) だけで決まるので、同じ組み合わせはLLMを1回だけ呼び、以前の呼び出しで作ったタイトルはキャッシュから再利用
+        entry_keys = [
+            (str(row_data.get('期待結果', 'N/A')), str(row_data.get('備考', 'N/A'))) if row_data is not None else None
+            for _, row_data in entries
+        ]
+        titles = {key: title for key in dict.fromkeys(entry_keys) if key and (title := _get_cached_bug_title(key))}
+        pending = [key for key in dict.fromkeys(entry_keys) if key and key not in titles]
+
+        # 残りの組み合わせは互いに独立しているのでまとめてリクエスト (同時リクエスト数はセマフォで制限)
+        sem = asyncio.Semaphore(LLM_CONCURRENCY)
+        results = await asyncio.gather(*[_generate_bug_title(ctx, sem, *key) for key in pending], return_exceptions=True)
+        for key, result in zip(pending, results):
+            titles[key] = result
+            if not isinstance(result, BaseException) and result != DEFAULT_BUG_TITLE:
+                _cache_bug_title(key, result)
+
+        for (item_id, row_data), key in zip(entries, entry_keys):
+            if row_data is None:
                 # メッセージを日本語に
-                report_list.append(f"⚠️ {item_id} → データなし\\n")
+                report_list.append(f"⚠️ {item_id} → データなし\n")
                 continue
 
-            row_data = row.iloc[0]
-
             # カラム名はExcelファイルに合わせる
             expected_result = row_data.get('期待結果', 'N/A') # .get()でキー存在確認
             actual_result_notes = row_data.get('備考', 'N/A') # .get()でキー存在確認
 
-            generated_title = f"仮タイトル" # デフォルト値を設定 
-
-            try:
-                # LLMにタイトル生成を依頼 
-                prompt = f'''以下の情報に基づいて、バグレポートのタイトルを「期待結果はAだったが、実際の結果はBだった」という形式で簡潔に作成してください:
-
-                期待結果: {expected_result}
-                実際の結果または備考: {actual_result_notes}
-
-                タイトル:'''
-                title_response = await ctx.sample(prompt, max_tokens=100) # max_tokens は適切に調整
-                generated_title = title_response.text.strip() if title_response.text else generated_title
-
-            except Exception as llm_error:
+            generated_title = titles[key]
+            if isinstance(generated_title, BaseException):
                 # LLM呼び出し失敗時のログ記録とデフォルトタイトル使用
-                await ctx.warning(f"LLMタイトル生成失敗 (ID: {item_id}): {llm_error}")
+                await ctx.warning(f"LLMタイトル生成失敗 (ID: {item_id}): {generated_title}")
                 llm_failures += 1
-                # generated_title はデフォルト値のまま
+                generated_title = DEFAULT_BUG_TITLE
 
             # レポートのラベルを日本語に、カラム名はExcelに合わせる
             report = f'''
@@ -299,14 +601,16 @@ EXPECTED_HEADERS = [
     "試験結果", "利用端末", "アプリケーションバージョン", "備考", "内部バグDB"
 ]
 
+EXCEL_WRITE_LOCK = asyncio.Lock() # Excel書き込みの直列化用
+
 @mcp.tool()
-def add_test_item_to_excel(
+async def add_test_item_to_excel(
     xlsx_path: str,
     items: list[dict], # 試験項目辞書のリスト
 ) -> str:
     """
     Excelファイルに複数の新しい試験項目を追加します。
-    各項目の '試験結果' は 'NY' に固定され、'利用端末', 'アプリケーションバージョン', '備考', '内部버그DB' は空白になります。
+    各項目の '試験結果' は 'NY' に固定され、'利用端末', 'アプリケーションバージョン', '備考', '内部バグDB' は空白になります。
     ファイルが存在しない場合は、ヘッダーとともに新規作成します。
     Excelのカラム名は元のファイルに合わせてください。
 
@@ -318,26 +622,47 @@ def add_test_item_to_excel(
     Returns:
         str: 処理の成功または失敗メッセージ。
     """
-    try:
-        df = None
-        # 1. ファイル読み込み試行 (同期)
-        try:
-            df = pd.read_excel(xlsx_path)
-            missing_headers = [h for h in EXPECTED_HEADERS if h not in df.columns]
-            if missing_headers:
-                 # print(f"情報: 既存ファイルに不足しているヘッダー {missing_headers} を追加します。")
-                 for header in missing_headers:
-                     df[header] = pd.NA
-                 df = df[EXPECTED_HEADERS]
-
-        except FileNotFoundError:
-            # print(f"情報: ファイル '{xlsx_path}' が見つからないため、新規作成します。")
-            df = pd.DataFrame(columns=EXPECTED_HEADERS)
-        except Exception as read_error:
-             # エラーメッセージを日本語に
-             return f"❌ ファイル読み込みエラー: {read_error}"
+    # 読み込み〜保存はブロッキング処理なので別スレッドで実行。
+    # 同時に呼ばれると後から保存した方が先の追加分を上書きしてしまうため、ロックで1件ずつ処理する
+    async with EXCEL_WRITE_LOCK:
+        return await asyncio.to_thread(_add_test_items, xlsx_path, items)
 
-        # 2. 新しいデータ行を格納するリストを作成
+def _open_test_item_sheet(xlsx_path: str):
+    """
+    試験項目Excelの最初のシートを開いて (ワークブック, シート, {ヘッダー: 列番号}) を返す。
+    既存ファイルでは、1行目にないヘッダーを右端に追加する。
+    ファイルがなければヘッダー行だけを書いた書き込み専用のワークブックを新規作成する。
+    """
+    try:
+        wb = load_workbook(xlsx_path)
+    except FileNotFoundError:
+        # 新規ファイルは書き込み専用モードで作成 (セルをメモリ上に保持せず、追加した行をそのままXMLに書き出す)
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(EXPECTED_HEADERS)
+        return wb, ws, {header: column for column, header in enumerate(EXPECTED_HEADERS, start=1)}
+    ws = wb.worksheets[0]
+
+    columns = {cell.value: cell.column for cell in ws[1] if cell.value is not None}
+    next_column = ws.max_column + 1 if columns else 1
+    for header in EXPECTED_HEADERS:
+        if header not in columns:
+            ws.cell(row=1, column=next_column, value=header)
+            columns[header] = next_column
+            next_column += 1
+    return wb, ws, columns
+
+def _to_sheet_row(columns: dict[str, int], values: dict) -> list:
+    """{ヘッダー: 値} を列番号順のリストに変換 (値のない列は None)"""
+    row = [None] * max(columns.values())
+    for header, value in values.items():
+        row[columns[header] - 1] = value
+    return row
+
+def _add_test_items(xlsx_path: str, items: list[dict]) -> str:
+    """add_test_item_to_excel の本体 (同期)"""
+    try:
+        # 1. 新しいデータ行を格納するリストを作成
         new_rows = []
         added_ids = []
         skipped_items = 0
@@ -350,17 +675,13 @@ def add_test_item_to_excel(
                 skipped_items += 1
                 continue
 
-            # カラム名はExcelファイルに合わせる
+            # カラム名はExcelファイルに合わせる ('利用端末', 'アプリケーションバージョン', '備考', '内部バグDB' は空欄)
             new_data = {
-                "시험항목ID": item.get('item_id'),
-                "확인내용": item.get('check_content'),
-                "시험순서": item.get('test_procedure'),
-                "기대결과": item.get('expected_result'),
-                "시험결과": "NY",
-                "이용단말": pd.NA,
-                "어플리케이션 버전": pd.NA,
-                "비고": pd.NA,
-                "내부버그DB": pd.NA
+                "試験項目ID": item.get('item_id'),
+                "確認内容": item.get('check_content'),
+                "試験手順": item.get('test_procedure'),
+                "期待結果": item.get('expected_result'),
+                "試験結果": "NY",
             }
             new_rows.append(new_data)
             added_ids.append(str(item.get('item_id')))
@@ -369,13 +690,21 @@ def add_test_item_to_excel(
              # メッセージを日本語に ([スキップ]を追加)
              return f"⚠️ 追加する有効な項目がありません。(スキップされた項目数: {skipped_items})"
 
-        # 3. 新しい行をDataFrameに変換し、既存のDataFrameに追加
-        new_rows_df = pd.DataFrame(new_rows)
-        df = pd.concat([df, new_rows_df], ignore_index=True)
+        # 2. ワークブックを開く。DataFrameで全体を読み書きせず、シートの末尾に行を追加するだけにする
+        try:
+            wb, ws, columns = _open_test_item_sheet(xlsx_path)
+        except Exception as read_error:
+             # エラーメッセージを日本語に
+             return f"❌ ファイル読み込みエラー: {read_error}"
+
+        # 3. ヘッダーの位置に合わせて新しい行を追加
+        for new_data in new_rows:
+            ws.append(_to_sheet_row(columns, new_data))
 
-        # 4. 修正されたDataFrameをExcelファイルに保存 (同期)
+        # 4. Excelファイルに保存
         try:
-            df.to_excel(xlsx_path, index=False, engine='openpyxl')
+            wb.save(xlsx_path)
+            _open_excel.cache_clear() # 更新前の内容を保持したExcelFileは不要になるので破棄
             # メッセージを日本語に ([スキップ]を追加)
             result_message = f"✅ 合計 {len(added_ids)} 件の試験項目追加完了: {', '.join(added_ids)}"
             if skipped_items > 0: